@@ -1,11 +1,10 @@
-from pathlib import Path
+import shlex
+from typing import Annotated
 
-import pandas as pd
 import typer
 
-from yyprep.dicom2bids.convert import convert_dicom_to_bids
-from yyprep.dicom2bids.intended_for import update_intended_for
-from yyprep.fmriprep.interface import create_fmriprep_workflow
+# Heavy dependencies (pandas, pybids, nipype) are imported inside the commands
+# that need them so that `--help` and unrelated subcommands start quickly.
 
 app = typer.Typer(
     help="Convert DICOM directories to BIDS format and preprocess with fMRIPrep."
@@ -24,7 +23,7 @@ def dicom2bids(
         ..., "--heuristic", help="Path to heuristic Python file for heudiconv"
     ),
     heudiconv_template: str = typer.Option(
-        "heudiconv -d '{dicom_directory}' -s {subject_id} -ss {session_id} "
+        "heudiconv -d {dicom_directory} -s {subject_id} -ss {session_id} "
         "-o {output_directory} -f {heuristic} -c dcm2niix",
         help="Template for heudiconv command.",
     ),
@@ -37,11 +36,36 @@ def dicom2bids(
     dry_run: bool = typer.Option(
         False, "--dry-run", help="Print commands but do not run conversion."
     ),
+    reindex: bool = typer.Option(
+        True,
+        "--reindex/--no-reindex",
+        help="Rebuild the cached PyBIDS index before updating IntendedFor. "
+        "Use --no-reindex to reuse it when no new data was converted.",
+    ),
+    jobs: int | None = typer.Option(
+        None,
+        "--jobs",
+        "-j",
+        min=1,
+        help="Number of heudiconv processes to run in parallel "
+        "(default: min(#rows, #CPUs)).",
+    ),
 ):
     """
     Converts DICOMs to BIDS and updates fieldmaps for fMRIPrep.
     """
-    df = pd.read_csv(participants_csv)
+    import pandas as pd
+
+    from yyprep.dicom2bids.convert import convert_dicom_to_bids
+    from yyprep.dicom2bids.intended_for import update_intended_for
+
+    # Read identifiers as strings so codes like "001" keep their zero padding
+    columns = ["subject_code", "session_id", "dicom_path"]
+    df = pd.read_csv(
+        participants_csv,
+        usecols=columns,
+        dtype=dict.fromkeys(columns, "string"),
+    )
 
     if dry_run:
         typer.echo(
@@ -56,103 +80,111 @@ def dicom2bids(
         overwrite=overwrite,
         heuristic=heuristic,
         bids_path=bids_dir,
+        n_jobs=jobs,
     )
     if not skip_intendedfor:
         typer.echo("Updating IntendedFor fields...")
-        update_intended_for(bids_dir, df)
+        update_intended_for(df=df, bids_path=bids_dir, reindex=reindex)
 
 
 @app.command()
 def fmriprep(
     bids_dir: str = typer.Argument(..., help="Path to BIDS dataset directory"),
     output_dir: str = typer.Argument(..., help="Path to output directory"),
-    participant_label: list[str] | None = None,
-    session_id: list[str] | None = None,
-    task_id: list[str] | None = None,
-    output_spaces: list[str] | None = None,
-    fs_license_file: str | None = None,
-    work_dir: str | None = None,
-    n_cpus: int | None = None,
-    omp_nthreads: int | None = None,
-    mem_gb: float | None = None,
-    bids_filter_file: str | None = None,
-    skip_bids_validation: bool = False,
-    low_mem: bool = False,
-    docker_image: str = "nipreps/fmriprep:latest",
-    dry_run: bool = False,
-):
-    participant_label = typer.Option(
-        None, "--participant-label", help="List of participant labels to process"
-    )
-    session_id = typer.Option(
-        None, "--session-id", help="List of session IDs to process"
-    )
-    task_id = typer.Option(None, "--task-id", help="List of task IDs to process")
-    output_spaces = typer.Option(
-        None, "--output-spaces", help="Output spaces for resampling"
-    )
-    fs_license_file = typer.Option(
+    participant_label: Annotated[
+        list[str] | None,
+        typer.Option(
+            "--participant-label", help="List of participant labels to process"
+        ),
+    ] = None,
+    session_id: Annotated[
+        list[str] | None,
+        typer.Option("--session-id", help="List of session IDs to process"),
+    ] = None,
+    task_id: str | None = typer.Option(
+        None, "--task-id", help="Task ID to process (fMRIPrep accepts one)"
+    ),
+    output_spaces: Annotated[
+        list[str] | None,
+        typer.Option("--output-spaces", help="Output spaces for resampling"),
+    ] = None,
+    fs_license_file: str | None = typer.Option(
         None, "--fs-license-file", help="Path to FreeSurfer license file"
-    )
-    work_dir = typer.Option(
+    ),
+    work_dir: str | None = typer.Option(
         None, "--work-dir", help="Working directory for temporary files"
-    )
-    n_cpus = typer.Option(None, "--n-cpus", help="Number of CPUs to use")
-    omp_nthreads = typer.Option(
-        None, "--omp-nthreads", help="Maximum number of threads per process"
-    )
-    mem_gb = typer.Option(None, "--mem-gb", help="Memory limit in GB")
-    bids_filter_file = typer.Option(
+    ),
+    n_cpus: int | None = typer.Option(None, "--n-cpus", help="Number of CPUs to use"),
+    omp_nthreads: int | None = typer.Option(
+        None,
+        "--omp-nthreads",
+        help="Maximum number of threads per process "
+        "(default with --n-cpus: min(8, n_cpus // 2))",
+    ),
+    mem_mb: int | None = typer.Option(None, "--mem-mb", help="Memory limit in MB"),
+    mem_gb: float | None = typer.Option(
+        None, "--mem-gb", help="Memory limit in GB (alternative to --mem-mb)"
+    ),
+    bids_filter_file: str | None = typer.Option(
         None, "--bids-filter-file", help="Path to BIDS filter file"
-    )
-    skip_bids_validation = typer.Option(
+    ),
+    skip_bids_validation: bool = typer.Option(
         False, "--skip-bids-validation", help="Skip BIDS validation"
-    )
-    low_mem = typer.Option(False, "--low-mem", help="Attempt to reduce memory usage")
-    docker_image = typer.Option(
+    ),
+    low_mem: bool = typer.Option(
+        False, "--low-mem", help="Attempt to reduce memory usage"
+    ),
+    docker_image: str = typer.Option(
         "nipreps/fmriprep:latest", "--docker-image", help="Docker image to use"
-    )
-    dry_run = typer.Option(
+    ),
+    dry_run: bool = typer.Option(
         False, "--dry-run", help="Print command but do not run fMRIPrep"
-    )
+    ),
+):
     """
     Run fMRIPrep preprocessing on BIDS dataset using Docker.
     """
-    if dry_run:
-        typer.echo("Dry run: would run fMRIPrep preprocessing.")
-        return
-
     # Set default output spaces if not provided
     if output_spaces is None:
         output_spaces = ["MNI152NLin2009cAsym:res-2"]
 
-    # Create work directory if specified
-    if work_dir:
-        Path(work_dir).mkdir(parents=True, exist_ok=True)
+    inputs = {
+        "bids_dir": bids_dir,
+        "output_dir": output_dir,
+        "participant_label": participant_label,
+        "session_id": session_id,
+        "task_id": [task_id] if task_id else None,
+        "output_spaces": output_spaces,
+        "fs_license_file": fs_license_file,
+        "work_dir": work_dir,
+        "n_cpus": n_cpus,
+        "omp_nthreads": omp_nthreads,
+        "mem_mb": mem_mb,
+        "mem_gb": mem_gb,
+        "bids_filter_file": bids_filter_file,
+        "skip_bids_validation": skip_bids_validation,
+        "low_mem": low_mem,
+        "docker_image": docker_image,
+    }
+
+    from yyprep.fmriprep.interface import build_fmriprep_argv
+
+    # Validate option combinations up front, for dry and real runs alike
+    try:
+        cmd = build_fmriprep_argv(inputs)
+    except ValueError as e:
+        raise typer.BadParameter(str(e)) from e
 
-    # Create output directory
-    Path(output_dir).mkdir(parents=True, exist_ok=True)
+    if dry_run:
+        typer.echo(shlex.join(cmd))
+        return
 
     typer.echo(f"Running fMRIPrep on {bids_dir}...")
 
+    from yyprep.fmriprep.interface import create_fmriprep_workflow
+
     # Create fMRIPrep workflow
-    workflow = create_fmriprep_workflow(
-        bids_dir=bids_dir,
-        output_dir=output_dir,
-        participant_label=participant_label,
-        session_id=session_id,
-        task_id=task_id,
-        output_spaces=output_spaces,
-        fs_license_file=fs_license_file,
-        work_dir=work_dir,
-        n_cpus=n_cpus,
-        omp_nthreads=omp_nthreads,
-        mem_gb=mem_gb,
-        bids_filter_file=bids_filter_file,
-        skip_bids_validation=skip_bids_validation,
-        low_mem=low_mem,
-        docker_image=docker_image,
-    )
+    workflow = create_fmriprep_workflow(**inputs)
 
     try:
         result = workflow.run()
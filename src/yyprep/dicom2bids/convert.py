@@ -1,4 +1,9 @@
+import glob
+import os
+import shlex
 import subprocess
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import partial
 from pathlib import Path
 
 import pandas as pd
@@ -6,48 +11,134 @@ import pandas as pd
 from yyprep.static.templates import HEUDICONV_CMD_TEMPLATE
 
 
+def _format_command(heudiconv_cmd_template: str, fields: dict) -> list[str]:
+    """
+    Build the argv for a Heudiconv command template.
+
+    The template is tokenized *before* formatting, so substituted values that
+    contain spaces stay a single argument without any shell quoting. Wildcards
+    written in the template are expanded like a shell would (the substituted
+    values are escaped so only the template's own wildcards match); patterns
+    without a match are passed through unchanged.
+    """
+    fields = {key: str(value) for key, value in fields.items()}
+    escaped = {key: glob.escape(value) for key, value in fields.items()}
+    cmd = []
+    for token in shlex.split(heudiconv_cmd_template):
+        arg = token.format(**fields)
+        if glob.has_magic(token):
+            cmd.extend(sorted(glob.glob(token.format(**escaped))) or [arg])
+        else:
+            cmd.append(arg)
+    return cmd
+
+
+def _run_one(
+    row: dict,
+    heudiconv_cmd_template: str,
+    heuristic: str,
+    bids_path: str,
+    overwrite: bool = False,
+):
+    """
+    Run Heudiconv for a single subject/session row.
+
+    Parameters
+    ----------
+    row : dict
+        Record with ``subject_code``, ``session_id`` and ``dicom_path`` keys.
+    heudiconv_cmd_template : str
+        Template for the Heudiconv command.
+    heuristic : str
+        Heuristic file for the conversion.
+    bids_path : str
+        Output directory for BIDS files.
+    overwrite : bool, optional
+        If True, overwrite existing BIDS files, by default False
+    """
+    fields = {
+        "dicom_directory": row["dicom_path"],
+        "subject_id": row["subject_code"],
+        "session_id": row["session_id"],
+        "output_directory": bids_path,
+        "heuristic": heuristic,
+    }
+    cmd = _format_command(heudiconv_cmd_template, fields)
+    if overwrite:
+        cmd.append("--overwrite")
+    print(f"Running: {shlex.join(cmd)}")
+    subprocess.run(cmd, check=True)
+
+
 def convert_dicom_to_bids(
     df: pd.DataFrame,
     heuristic: Path | str,
     bids_path: Path | str,
-    heudiconv_cmd_template: Path | str = HEUDICONV_CMD_TEMPLATE,
+    heudiconv_cmd_template: str = HEUDICONV_CMD_TEMPLATE,
     overwrite: bool = False,
+    n_jobs: int | None = None,
 ):  # noqa: E501, UP007
     """
     Convert DICOM files to BIDS format using Heudiconv.
 
+    Each subject/session row is converted independently, so the Heudiconv
+    invocations are dispatched to a thread pool.
+
     Parameters
     ----------
     df : pd.DataFrame
         DataFrame containing DICOM file information.
-    heudiconv_cmd_template : Path | str
-        Template for the Heudiconv command.
+    heudiconv_cmd_template : str
+        Format string for the Heudiconv command, with ``{dicom_directory}``,
+        ``{subject_id}``, ``{session_id}``, ``{output_directory}`` and
+        ``{heuristic}`` placeholders.
     heuristic : Path | str
         Heuristic file for the conversion.
     bids_path : Path | str
         Output directory for BIDS files.
     overwrite : bool, optional
         If True, overwrite existing BIDS files, by default False
+    n_jobs : int, optional
+        Number of Heudiconv processes to run concurrently. Defaults to
+        ``min(len(df), os.cpu_count())``.
+
+    Raises
+    ------
+    RuntimeError
+        If Heudiconv fails for any subject/session. All rows are still
+        attempted; the error lists every failure.
     """
-    heudiconv_cmd_template = Path(heudiconv_cmd_template)
-    if not heudiconv_cmd_template.exists():
-        raise FileNotFoundError(
-            f"Heudiconv command template not found: {heudiconv_cmd_template}"
-        )
-    if not Path(heuristic).exists():
+    heuristic = Path(heuristic)
+    if not heuristic.is_file():
         raise FileNotFoundError(f"Heuristic file not found: {heuristic}")
-    for _, row in df.iterrows():
-        subject_code = row["subject_code"]
-        dicom_path = Path(row["dicom_path"])
-        session_id = row["session_id"]
-        cmd = heudiconv_cmd_template.format(
-            dicom_directory=dicom_path,
-            subject_id=subject_code,
-            session_id=session_id,
-            output_directory=bids_path,
-            heuristic=heuristic,
+    rows = df.to_dict("records")
+    if not rows:
+        return
+    if n_jobs is None:
+        n_jobs = min(len(rows), os.cpu_count() or 1)
+    run_one = partial(
+        _run_one,
+        heudiconv_cmd_template=heudiconv_cmd_template,
+        heuristic=str(heuristic),
+        bids_path=str(bids_path),
+        overwrite=overwrite,
+    )
+    failures = []
+    with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+        futures = {executor.submit(run_one, row): i for i, row in enumerate(rows)}
+        for future in as_completed(futures):
+            try:
+                future.result()
+            except subprocess.CalledProcessError as exc:
+                failures.append((futures[future], exc))
+    if failures:
+        failures = [(rows[i], exc) for i, exc in sorted(failures, key=lambda f: f[0])]
+        details = "\n".join(
+            f"  sub-{row['subject_code']} ses-{row['session_id']}: "
+            f"exit status {exc.returncode}"
+            for row, exc in failures
         )
-        if overwrite:
-            cmd += " --overwrite"
-        print(f"Running: {cmd}")
-        subprocess.run(cmd, shell=True, check=True)
+        raise RuntimeError(
+            f"Heudiconv failed for {len(failures)} of {len(rows)} "
+            f"subject/session(s):\n{details}"
+        ) from failures[0][1]
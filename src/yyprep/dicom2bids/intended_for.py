@@ -1,26 +1,113 @@
 import json
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from pathlib import Path
 
 import pandas as pd
 from bids.layout import BIDSLayout
 
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
 
-def update_intended_for(df: pd.DataFrame, bids_path: Path | str):
+# Directory (relative to the BIDS root) holding the persistent PyBIDS index.
+# Dot-prefixed so that both PyBIDS and the BIDS validator ignore it.
+PYBIDS_DATABASE_DIRNAME = ".pybids_cache"
+
+# Upper bound on concurrent fmap sidecar rewrites per subject/session.
+MAX_REWRITE_WORKERS = 8
+
+
+def _read_json(path: Path | str) -> dict:
+    """Read a JSON sidecar, using orjson when it is installed."""
+    raw = Path(path).read_bytes()
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+def _write_json(path: Path | str, data: dict):
+    """Write a JSON sidecar with sorted keys and 2-space indentation."""
+    if orjson is not None:
+        raw = orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS)
+    else:
+        raw = json.dumps(data, indent=2, sort_keys=True, ensure_ascii=False).encode(
+            "utf-8"
+        )
+    Path(path).write_bytes(raw)
+
+
+def _rewrite_one(fmap_json: Path | str, funcs_addition: frozenset[str]) -> bool:
+    """
+    Merge ``funcs_addition`` into the 'IntendedFor' field of a single fmap JSON.
+
+    Parameters
+    ----------
+    fmap_json : Path | str
+        Path to the fmap JSON sidecar.
+    funcs_addition : frozenset[str]
+        BIDS URIs of the functional runs the fmap applies to.
+
+    Returns
+    -------
+    bool
+        True if the sidecar was rewritten, False if it was already up to date.
+    """
+    data = _read_json(fmap_json)
+    fmap_intended_for = data.get("IntendedFor", [])
+    if isinstance(fmap_intended_for, str):
+        # BIDS allows a single path instead of a list
+        fmap_intended_for = [fmap_intended_for]
+    current = set(fmap_intended_for)
+    if funcs_addition <= current:
+        # Already up to date; avoid rewriting the sidecar.
+        return False
+    fmap_intended_for = sorted(current | funcs_addition)
+    data["IntendedFor"] = fmap_intended_for
+    _write_json(fmap_json, data)
+    print(f"Updated {fmap_json} with IntendedFor: {fmap_intended_for}")
+    return True
+
+
+def update_intended_for(
+    df: pd.DataFrame, bids_path: Path | str, reindex: bool = True
+):
     """
     Update the 'IntendedFor' field in BIDS fmap JSON files based on the provided DataFrame.
 
+    The PyBIDS index is stored in an SQLite database under the BIDS root. It is
+    rebuilt by default; pass ``reindex=False`` to reuse it when no files were
+    added to the dataset since the last run.
+
     Parameters
     ----------
     bids_path : Path | str
         Path to the BIDS dataset.
     df : pd.DataFrame
         DataFrame containing the mapping information.
+    reindex : bool, optional
+        If True, discard the cached PyBIDS index and rebuild it. Only set to
+        False if no files were added to the dataset since the last indexing,
+        otherwise new fmaps are missed, by default True
     """
-    layout = BIDSLayout(bids_path, validate=True)
+    layout = BIDSLayout(
+        bids_path,
+        validate=True,
+        database_path=Path(bids_path) / PYBIDS_DATABASE_DIRNAME,
+        reset_database=reindex,
+    )
 
-    for _, row in df.iterrows():
-        subject = row["subject_code"]
-        session = row.get("session_id", None)
+    # File paths returned by the layout are absolute, so strip the resolved
+    # dataset root rather than the (possibly relative) ``bids_path``.
+    bids_prefix = str(layout.root).rstrip("/") + "/"
+
+    # Rows sharing a subject/session resolve to the same fmaps and funcs, so
+    # query the layout once per unique pair.
+    sessions = df.reindex(columns=["subject_code", "session_id"]).drop_duplicates()
+    for row in sessions.itertuples(index=False):
+        subject = row.subject_code
+        session = None if pd.isna(row.session_id) else row.session_id
 
         fmaps = layout.get(
             subject=subject, session=session, datatype="fmap", extension="json"
@@ -28,18 +115,13 @@ def update_intended_for(df: pd.DataFrame, bids_path: Path | str):
         funcs_to_include = layout.get(
             subject=subject, session=session, datatype="func", extension="nii.gz"
         )
-        funcs_to_include = [
-            f.path.replace(str(bids_path) + "/", "") for f in funcs_to_include
-        ]
-        funcs_addition = [f"bids::{addition}" for addition in funcs_to_include]
-
-        for fmap in fmaps:
-            fmap_json = fmap.path
-            with open(fmap_json) as f:
-                data = json.load(f)
-            fmap_intended_for = data.get("IntendedFor", [])
-            fmap_intended_for = list(set(fmap_intended_for + funcs_addition))
-            data["IntendedFor"] = fmap_intended_for
-            with open(fmap_json, "w") as f:
-                json.dump(data, f, indent=4)
-            print(f"Updated {fmap_json} with IntendedFor: {fmap_intended_for}")
+        funcs_to_include = [f.path.removeprefix(bids_prefix) for f in funcs_to_include]
+        funcs_addition = frozenset(f"bids::{addition}" for addition in funcs_to_include)
+
+        if not fmaps:
+            continue
+        rewrite = partial(_rewrite_one, funcs_addition=funcs_addition)
+        with ThreadPoolExecutor(
+            max_workers=min(MAX_REWRITE_WORKERS, len(fmaps))
+        ) as executor:
+            list(executor.map(rewrite, (fmap.path for fmap in fmaps)))
@@ -1,5 +1,5 @@
 """fMRIPrep interface module for yyprep."""
 
-from .interface import FMRIPrepInterface
+from .interface import FMRIPrepInterface, build_fmriprep_argv
 
-__all__ = ["FMRIPrepInterface"]
+__all__ = ["FMRIPrepInterface", "build_fmriprep_argv"]
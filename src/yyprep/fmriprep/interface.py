@@ -5,6 +5,8 @@ This module provides a nipype-compatible interface for running fMRIPrep
 by leveraging the existing fmriprep-docker package.
 """
 
+import collections
+import functools
 import subprocess
 from pathlib import Path
 
@@ -18,6 +20,137 @@ from nipype.interfaces.base import (
     Directory,
 )
 
+# Number of trailing fmriprep-docker output lines kept on the runtime object
+OUTPUT_TAIL_LINES = 200
+
+# Optional fmriprep-docker arguments as (input name, flag, kind), where kind is
+# one of "list" (flag followed by all values), "single" (list holding at most
+# one value, as fMRIPrep only accepts one), "flag" (boolean switch) or
+# "scalar" (flag followed by one value). Empty lists emit nothing.
+_FMRIPREP_DOCKER_ARGS = (
+    ("participant_label", "--participant-label", "list"),
+    ("session_id", "--session-id", "list"),
+    ("task_id", "--task-id", "single"),
+    ("output_spaces", "--output-spaces", "list"),
+    ("skip_bids_validation", "--skip_bids_validation", "flag"),
+    ("fs_license_file", "--fs-license-file", "scalar"),
+    ("work_dir", "--work-dir", "scalar"),
+    ("n_cpus", "--n_cpus", "scalar"),
+    ("omp_nthreads", "--omp-nthreads", "scalar"),
+    ("mem_mb", "--mem-mb", "scalar"),
+    ("low_mem", "--low-mem", "flag"),
+    ("bids_filter_file", "--bids-filter-file", "scalar"),
+    ("verbose", "--verbose", "flag"),
+)
+
+
+def build_fmriprep_argv(inputs: dict) -> list[str]:
+    """
+    Build the fmriprep-docker command line from a plain mapping of inputs.
+
+    This does not touch the filesystem or instantiate the interface, so it
+    can be used to preview a command cheaply (e.g. for dry runs).
+
+    Parameters
+    ----------
+    inputs : dict
+        Mapping of FMRIPrepInterface input names to values. ``bids_dir`` and
+        ``output_dir`` are required; missing or ``None`` entries are treated
+        as unset.
+
+    Returns
+    -------
+    list of str
+        The fmriprep-docker argv.
+
+    Raises
+    ------
+    ValueError
+        If mutually exclusive inputs are combined, or ``task_id`` holds more
+        than one task.
+    """
+    inputs = {key: value for key, value in inputs.items() if value is not None}
+
+    # Without an explicit per-process thread count, fMRIPrep lets each
+    # process use every CPU and over-commits multi-threaded nodes; default
+    # to half the CPUs, capped at 8.
+    if "n_cpus" in inputs and "omp_nthreads" not in inputs:
+        inputs["omp_nthreads"] = min(8, max(1, inputs["n_cpus"] // 2))
+
+    # Add required arguments
+    cmd = [
+        "fmriprep-docker",
+        str(inputs["bids_dir"]),
+        str(inputs["output_dir"]),
+        "participant",
+    ]
+
+    # Add optional arguments
+    for name, flag, kind in _FMRIPREP_DOCKER_ARGS:
+        if name not in inputs:
+            continue
+        value = inputs[name]
+        if kind in ("list", "single"):
+            if kind == "single" and len(value) > 1:
+                raise ValueError(f"{flag} accepts a single value, got {value}")
+            if value:
+                cmd.extend([flag, *value])
+        elif kind == "flag":
+            if value:
+                cmd.append(flag)
+        else:
+            cmd.extend([flag, str(value)])
+
+    # fmriprep-docker has no GB flag, so express mem_gb in MB
+    if "mem_gb" in inputs:
+        if "mem_mb" in inputs:
+            raise ValueError("mem_mb and mem_gb are mutually exclusive")
+        cmd.extend(["--mem-mb", str(int(inputs["mem_gb"] * 1000))])
+
+    # Add Docker image (fmriprep-docker's own flag is --image)
+    docker_version = inputs.get("docker_version", "latest")
+    if "docker_image" in inputs:
+        if docker_version != "latest":
+            raise ValueError("docker_image and docker_version are mutually exclusive")
+        cmd.extend(["--image", inputs["docker_image"]])
+    elif docker_version != "latest":
+        cmd.extend(["--image", f"nipreps/fmriprep:{docker_version}"])
+
+    return cmd
+
+
+@functools.cache
+def _check_fmriprep_docker():
+    """
+    Check if fmriprep-docker is available.
+
+    The probe spawns a subprocess, so a successful result is cached for the
+    lifetime of the process; failures are not cached and are retried.
+    """
+    print("Checking fmriprep-docker availability...")
+    try:
+        subprocess.run(
+            ["fmriprep-docker", "--no-tty", "--version"],
+            check=True,
+            capture_output=True,
+            text=True,
+        )
+    except (subprocess.CalledProcessError, FileNotFoundError) as exc:
+        raise RuntimeError(
+            "fmriprep-docker is not available. Please install it with: "
+            "pip install fmriprep-docker"
+        ) from exc
+
+
+def _ensure_dir(path: Path | str):
+    """Create ``path`` (and its parents) at most once per resolved location."""
+    _make_dir(Path(path).resolve())
+
+
+@functools.cache
+def _make_dir(path: Path):
+    path.mkdir(parents=True, exist_ok=True)
+
 
 class FMRIPrepInputSpec(BaseInterfaceInputSpec):
     """Input specification for FMRIPrep interface."""
@@ -47,7 +180,7 @@ class FMRIPrepInputSpec(BaseInterfaceInputSpec):
 
     task_id = traits.List(
         traits.Str(),
-        desc="Select specific tasks to be processed",
+        desc="Select a specific task to be processed (at most one)",
     )
 
     # Common fMRIPrep options
@@ -79,8 +212,15 @@ class FMRIPrepInputSpec(BaseInterfaceInputSpec):
         desc="Maximum number of threads per process",
     )
 
+    mem_mb = traits.Int(
+        xor=["mem_gb"],
+        desc="Upper bound memory limit for fMRIPrep processes in MB",
+    )
+
     mem_gb = traits.Float(
-        desc="Upper bound memory limit for fMRIPrep processes in GB",
+        xor=["mem_mb"],
+        desc="Upper bound memory limit for fMRIPrep processes in GB "
+        "(converted to MB, as fmriprep-docker only accepts --mem-mb)",
     )
 
     low_mem = traits.Bool(
@@ -98,7 +238,12 @@ class FMRIPrepInputSpec(BaseInterfaceInputSpec):
     docker_version = traits.Str(
         "latest",
         usedefault=True,
-        desc="fMRIPrep Docker image version",
+        desc="fMRIPrep Docker image version (tag of nipreps/fmriprep)",
+    )
+
+    docker_image = traits.Str(
+        desc="Full fMRIPrep Docker image (repository[:tag]), passed to "
+        "fmriprep-docker unchanged; takes precedence over docker_version",
     )
 
     verbose = traits.Bool(
@@ -140,128 +285,51 @@ class FMRIPrepInterface(BaseInterface):
     input_spec = FMRIPrepInputSpec
     output_spec = FMRIPrepOutputSpec
 
-    def __init__(self, **kwargs):
-        """Initialize the interface."""
-        super().__init__(**kwargs)
-        print("Checking fmriprep-docker availability...")
-        self._check_fmriprep_docker()
-
-    def _check_fmriprep_docker(self):
-        """Check if fmriprep-docker is available."""
-        try:
-            subprocess.run(
-                ["fmriprep-docker", "--no-tty", "--version"],
-                check=True,
-                capture_output=True,
-                text=True,
-            )
-        except (subprocess.CalledProcessError, FileNotFoundError) as exc:
-            raise RuntimeError(
-                "fmriprep-docker is not available. Please install it with: "
-                "pip install fmriprep-docker"
-            ) from exc
-
     def _format_command(self) -> list[str]:
         """Format the fmriprep-docker command."""
-        cmd = ["fmriprep-docker"]
-
-        # Add required arguments
-        cmd.extend(
-            [str(self.inputs.bids_dir), str(self.inputs.output_dir), "participant"]
-        )
-
-        # Add participant labels
-        if isdefined(self.inputs.participant_label):
-            for participant in self.inputs.participant_label:
-                cmd.extend(["--participant-label", participant])
-
-        # Add session IDs
-        if isdefined(self.inputs.session_id):
-            for session in self.inputs.session_id:
-                cmd.extend(["--session-id", session])
-
-        # Add task IDs
-        if isdefined(self.inputs.task_id):
-            for task in self.inputs.task_id:
-                cmd.extend(["--task-id", task])
-
-        # Add output spaces
-        if isdefined(self.inputs.output_spaces):
-            cmd.extend(["--output-spaces"] + self.inputs.output_spaces)
-
-        # Skip BIDS validation
-        if self.inputs.skip_bids_validation:
-            cmd.append("--skip_bids_validation")
-
-        # Add FreeSurfer license
-        if isdefined(self.inputs.fs_license_file):
-            cmd.extend(["--fs-license-file", str(self.inputs.fs_license_file)])
-
-        # Add work directory
-        if isdefined(self.inputs.work_dir):
-            cmd.extend(["--work-dir", str(self.inputs.work_dir)])
-
-        # Add performance options
-        if isdefined(self.inputs.n_cpus):
-            cmd.extend(["--n_cpus", str(self.inputs.n_cpus)])
-
-        if isdefined(self.inputs.omp_nthreads):
-            cmd.extend(["--omp-nthreads", str(self.inputs.omp_nthreads)])
-
-        if isdefined(self.inputs.mem_gb):
-            cmd.extend(["--mem_gb", str(self.inputs.mem_gb)])
-
-        if self.inputs.low_mem:
-            cmd.append("--low-mem")
-
-        # Add BIDS filter file
-        if isdefined(self.inputs.bids_filter_file):
-            cmd.extend(["--bids-filter-file", str(self.inputs.bids_filter_file)])
-
-        # Add Docker version
-        if (
-            isdefined(self.inputs.docker_version)
-            and self.inputs.docker_version != "latest"
-        ):
-            cmd.extend(
-                ["--docker-image", f"nipreps/fmriprep:{self.inputs.docker_version}"]
-            )
-
-        # Add verbose flag
-        if self.inputs.verbose:
-            cmd.append("--verbose")
-
-        return cmd
+        return build_fmriprep_argv(self.inputs.get_traitsfree())
 
     def _run_interface(self, runtime):
         """Run the fmriprep-docker command."""
+        _check_fmriprep_docker()
+
         # Create output directory if it doesn't exist
-        Path(self.inputs.output_dir).mkdir(parents=True, exist_ok=True)
+        _ensure_dir(self.inputs.output_dir)
 
         # Create work directory if specified
         if isdefined(self.inputs.work_dir):
-            Path(self.inputs.work_dir).mkdir(parents=True, exist_ok=True)
+            _ensure_dir(self.inputs.work_dir)
 
         cmd = self._format_command()
 
         # Log the command
         runtime.cmdline = " ".join(cmd)
 
-        # Run the command
-        result = subprocess.run(
-            cmd, capture_output=True, text=True, cwd=str(Path.cwd())
-        )
-
-        runtime.returncode = result.returncode
-        runtime.stdout = result.stdout
-        runtime.stderr = result.stderr
-
-        if result.returncode != 0:
+        # Run the command, streaming its (merged) output as it is produced and
+        # keeping only a bounded tail rather than buffering the full log
+        tail = collections.deque(maxlen=OUTPUT_TAIL_LINES)
+        with subprocess.Popen(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            bufsize=1,
+            cwd=str(Path.cwd()),
+        ) as proc:
+            for line in proc.stdout:
+                print(line, end="", flush=True)
+                tail.append(line)
+            proc.wait()
+
+        runtime.returncode = proc.returncode
+        runtime.stdout = "".join(tail)
+        runtime.stderr = ""
+
+        if proc.returncode != 0:
             raise RuntimeError(
-                f"fMRIPrep failed with return code {result.returncode}\n"
+                f"fMRIPrep failed with return code {proc.returncode}\n"
                 f"Command: {runtime.cmdline}\n"
-                f"Stdout: {result.stdout}\n"
-                f"Stderr: {result.stderr}"
+                f"Output (last {OUTPUT_TAIL_LINES} lines):\n{runtime.stdout}"
             )
 
         return runtime
@@ -279,6 +347,10 @@ class FMRIPrepInterface(BaseInterface):
         return outputs
 
 
+# Names accepted as inputs by FMRIPrepInterface
+_FMRIPREP_INPUT_NAMES = frozenset(FMRIPrepInputSpec.class_editable_traits())
+
+
 def create_fmriprep_workflow(
     bids_dir: str | Path,
     output_dir: str | Path,
@@ -300,7 +372,9 @@ def create_fmriprep_workflow(
     work_dir : str or Path, optional
         Working directory for temporary files
     **kwargs
-        Additional arguments to pass to FMRIPrepInterface
+        Additional arguments to pass to FMRIPrepInterface. If ``n_cpus`` is
+        given without ``omp_nthreads``, the command uses
+        ``min(8, n_cpus // 2)`` threads per process.
 
     Returns
     -------
@@ -317,6 +391,10 @@ def create_fmriprep_workflow(
     ... )
     >>> result = workflow.run()
     """
+    unknown = kwargs.keys() - _FMRIPREP_INPUT_NAMES
+    if unknown:
+        raise ValueError(f"Unknown input parameter: {', '.join(sorted(unknown))}")
+
     interface = FMRIPrepInterface()
 
     # Set required inputs
@@ -330,11 +408,9 @@ def create_fmriprep_workflow(
     if work_dir is not None:
         interface.inputs.work_dir = str(work_dir)
 
-    # Set additional kwargs
+    # Set additional kwargs, leaving inputs passed as None undefined
     for key, value in kwargs.items():
-        if hasattr(interface.inputs, key):
+        if value is not None:
             setattr(interface.inputs, key, value)
-        else:
-            raise ValueError(f"Unknown input parameter: {key}")
 
     return interface
@@ -1,18 +1,25 @@
+from collections.abc import Mapping
+from functools import lru_cache
 from pathlib import Path
+from types import MappingProxyType
 
 STATIC_DIR = Path(__file__).parent / "static"
 
 
-def get_heuristics():
+@lru_cache(maxsize=1)
+def get_heuristics() -> Mapping[str, Path]:
     """
     Load heuristics from a predefined file.
 
+    The heuristics directory ships with the package, so the scan is cached
+    for the lifetime of the process.
+
     Returns:
-        dict: A dictionary where keys are heuristic names and values are the corresponding heuristic file paths.
+        Mapping: A read-only mapping of heuristic names to the corresponding heuristic file paths.
     """
     heuristics_directory = STATIC_DIR / "heuristics"
     result = {}
     for fname in heuristics_directory.glob("*_heuristic.py"):
         heuristic_name = fname.name.replace("_heuristic.py", "")
         result[heuristic_name] = fname
-    return result
+    return MappingProxyType(result)
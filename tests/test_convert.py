@@ -0,0 +1,193 @@
+"""Tests for `yyprep.dicom2bids.convert`."""
+
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pytest
+
+from yyprep.dicom2bids import convert
+from yyprep.dicom2bids.convert import _format_command, convert_dicom_to_bids
+
+TEMPLATE = "heudiconv -d {dicom_directory} -s {subject_id} -ss {session_id}"
+
+
+@pytest.fixture
+def fields():
+    """Placeholder values shared by the template tests."""
+    return {
+        "subject_id": "001",
+        "session_id": "01",
+        "output_directory": "/bids",
+        "heuristic": "heuristic.py",
+    }
+
+
+def test_format_command_keeps_path_with_spaces_as_one_argument(tmp_path, fields):
+    dicom_dir = tmp_path / "dicom dir"
+    cmd = _format_command(
+        "heudiconv -d {dicom_directory} -s {subject_id}",
+        {**fields, "dicom_directory": dicom_dir},
+    )
+    assert cmd == ["heudiconv", "-d", str(dicom_dir), "-s", "001"]
+
+
+def test_format_command_accepts_quoted_placeholders(tmp_path, fields):
+    dicom_dir = tmp_path / "dicom dir"
+    cmd = _format_command(
+        "heudiconv -d '{dicom_directory}'", {**fields, "dicom_directory": dicom_dir}
+    )
+    assert cmd == ["heudiconv", "-d", str(dicom_dir)]
+
+
+def test_format_command_expands_template_globs(tmp_path, fields):
+    dicom_dir = tmp_path / "dicom dir"
+    (dicom_dir / "series").mkdir(parents=True)
+    for name in ("b.dcm", "a.dcm"):
+        (dicom_dir / "series" / name).touch()
+    cmd = _format_command(
+        "heudiconv --files {dicom_directory}/*/*.dcm -s {subject_id}",
+        {**fields, "dicom_directory": dicom_dir},
+    )
+    assert cmd == [
+        "heudiconv",
+        "--files",
+        str(dicom_dir / "series" / "a.dcm"),
+        str(dicom_dir / "series" / "b.dcm"),
+        "-s",
+        "001",
+    ]
+
+
+@pytest.mark.parametrize("dirname", ["sub[01]", "sub*01"])
+def test_format_command_escapes_wildcards_in_substituted_values(
+    tmp_path, fields, dirname
+):
+    dicom_dir = tmp_path / dirname
+    (dicom_dir / "series").mkdir(parents=True)
+    (dicom_dir / "series" / "a.dcm").touch()
+    # A sibling that would match if the substituted value were globbed
+    (tmp_path / "sub001" / "series").mkdir(parents=True)
+    (tmp_path / "sub001" / "series" / "a.dcm").touch()
+    cmd = _format_command(
+        "heudiconv --files {dicom_directory}/*/*.dcm",
+        {**fields, "dicom_directory": dicom_dir},
+    )
+    assert cmd == ["heudiconv", "--files", str(dicom_dir / "series" / "a.dcm")]
+
+
+def test_format_command_does_not_glob_substituted_values(tmp_path, fields):
+    (tmp_path / "sub1").mkdir()
+    dicom_dir = tmp_path / "sub*"
+    cmd = _format_command(
+        "heudiconv -d {dicom_directory}", {**fields, "dicom_directory": dicom_dir}
+    )
+    assert cmd == ["heudiconv", "-d", str(dicom_dir)]
+
+
+def test_format_command_passes_unmatched_globs_through(tmp_path, fields):
+    dicom_dir = tmp_path / "empty"
+    dicom_dir.mkdir()
+    cmd = _format_command(
+        "heudiconv --files {dicom_directory}/*/*.dcm",
+        {**fields, "dicom_directory": dicom_dir},
+    )
+    assert cmd == ["heudiconv", "--files", f"{dicom_dir}/*/*.dcm"]
+
+
+@pytest.fixture
+def heuristic(tmp_path):
+    """An (empty) heuristic file."""
+    path = tmp_path / "heuristic.py"
+    path.touch()
+    return path
+
+
+@pytest.fixture
+def participants():
+    """A participants table with four subject/session rows."""
+    return pd.DataFrame(
+        {
+            "subject_code": ["001", "002", "003", "004"],
+            "session_id": ["01", "01", "02", "01"],
+            "dicom_path": ["/dicom/a", "/dicom/b", "/dicom/c", "/dicom/d"],
+        }
+    )
+
+
+class _Calls(list):
+    """Recorded argvs, plus a ``fail`` mapping of subject -> exit status."""
+
+    def __init__(self):
+        super().__init__()
+        self.fail = {}
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    """Record heudiconv invocations, failing those for subjects in ``fail``."""
+    recorded = _Calls()
+
+    def fake_run(cmd, check):
+        recorded.append(cmd)
+        subject = cmd[cmd.index("-s") + 1]
+        if subject in recorded.fail:
+            raise subprocess.CalledProcessError(recorded.fail[subject], cmd)
+
+    monkeypatch.setattr(convert.subprocess, "run", fake_run)
+    return recorded
+
+
+def test_convert_runs_every_row(participants, heuristic, calls):
+    convert_dicom_to_bids(
+        participants, heuristic, "/bids", heudiconv_cmd_template=TEMPLATE
+    )
+    subjects = sorted(cmd[cmd.index("-s") + 1] for cmd in calls)
+    assert subjects == ["001", "002", "003", "004"]
+
+
+def test_convert_reports_all_failures_in_row_order(participants, heuristic, calls):
+    calls.fail.update({"004": 2, "002": 1})
+    with pytest.raises(RuntimeError) as excinfo:
+        convert_dicom_to_bids(
+            participants,
+            heuristic,
+            "/bids",
+            heudiconv_cmd_template=TEMPLATE,
+            n_jobs=4,
+        )
+    assert str(excinfo.value) == (
+        "Heudiconv failed for 2 of 4 subject/session(s):\n"
+        "  sub-002 ses-01: exit status 1\n"
+        "  sub-004 ses-01: exit status 2"
+    )
+    # Chained to the first failure in row order
+    assert isinstance(excinfo.value.__cause__, subprocess.CalledProcessError)
+    assert excinfo.value.__cause__.returncode == 1
+    # Failures do not stop the remaining rows
+    assert len(calls) == 4
+
+
+@pytest.mark.parametrize(("cpu_count", "expected"), [(2, 2), (16, 4), (None, 1)])
+def test_convert_defaults_n_jobs(
+    participants, heuristic, calls, monkeypatch, cpu_count, expected
+):
+    workers = []
+
+    class RecordingExecutor(ThreadPoolExecutor):
+        def __init__(self, max_workers):
+            workers.append(max_workers)
+            super().__init__(max_workers=max_workers)
+
+    monkeypatch.setattr(convert.os, "cpu_count", lambda: cpu_count)
+    monkeypatch.setattr(convert, "ThreadPoolExecutor", RecordingExecutor)
+    convert_dicom_to_bids(
+        participants, heuristic, "/bids", heudiconv_cmd_template=TEMPLATE
+    )
+    assert workers == [expected]
+
+
+def test_convert_empty_dataframe_is_a_noop(heuristic, calls):
+    df = pd.DataFrame(columns=["subject_code", "session_id", "dicom_path"])
+    convert_dicom_to_bids(df, heuristic, "/bids", heudiconv_cmd_template=TEMPLATE)
+    assert calls == []
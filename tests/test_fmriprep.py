@@ -0,0 +1,149 @@
+"""Tests for `yyprep.fmriprep.interface`."""
+
+import pytest
+
+from yyprep.fmriprep.interface import FMRIPrepInterface, build_fmriprep_argv
+
+REQUIRED = ["fmriprep-docker", "/bids", "/out", "participant"]
+
+
+def argv(**inputs):
+    """Build the argv for the required inputs plus ``inputs``."""
+    return build_fmriprep_argv({"bids_dir": "/bids", "output_dir": "/out", **inputs})
+
+
+def test_required_arguments_only():
+    assert argv() == REQUIRED
+
+
+def test_argument_table():
+    cmd = argv(
+        participant_label=["001", "002"],
+        session_id=["01"],
+        task_id=["rest"],
+        output_spaces=["MNI152NLin2009cAsym:res-2", "fsaverage:den-10k"],
+        skip_bids_validation=True,
+        fs_license_file="/license.txt",
+        work_dir="/work",
+        n_cpus=8,
+        omp_nthreads=2,
+        mem_mb=16000,
+        low_mem=True,
+        bids_filter_file="/filter.json",
+        verbose=True,
+    )
+    assert cmd == REQUIRED + [
+        "--participant-label",
+        "001",
+        "002",
+        "--session-id",
+        "01",
+        "--task-id",
+        "rest",
+        "--output-spaces",
+        "MNI152NLin2009cAsym:res-2",
+        "fsaverage:den-10k",
+        "--skip_bids_validation",
+        "--fs-license-file",
+        "/license.txt",
+        "--work-dir",
+        "/work",
+        "--n_cpus",
+        "8",
+        "--omp-nthreads",
+        "2",
+        "--mem-mb",
+        "16000",
+        "--low-mem",
+        "--bids-filter-file",
+        "/filter.json",
+        "--verbose",
+    ]
+
+
+def test_unset_inputs_are_skipped():
+    assert (
+        argv(
+            participant_label=[],
+            output_spaces=None,
+            skip_bids_validation=False,
+            low_mem=False,
+            work_dir=None,
+        )
+        == REQUIRED
+    )
+
+
+def test_task_id_accepts_a_single_value():
+    with pytest.raises(ValueError, match="--task-id"):
+        argv(task_id=["rest", "nback"])
+
+
+@pytest.mark.parametrize(("n_cpus", "omp_nthreads"), [(1, 1), (3, 1), (12, 6), (32, 8)])
+def test_omp_nthreads_defaults_from_n_cpus(n_cpus, omp_nthreads):
+    cmd = argv(n_cpus=n_cpus)
+    assert cmd[cmd.index("--omp-nthreads") + 1] == str(omp_nthreads)
+
+
+def test_explicit_omp_nthreads_is_kept():
+    cmd = argv(n_cpus=12, omp_nthreads=3)
+    assert cmd[cmd.index("--omp-nthreads") + 1] == "3"
+
+
+def test_omp_nthreads_not_set_without_n_cpus():
+    assert "--omp-nthreads" not in argv()
+
+
+def test_mem_gb_is_converted_to_mb():
+    assert argv(mem_gb=16.0)[-2:] == ["--mem-mb", "16000"]
+
+
+def test_mem_mb_and_mem_gb_are_exclusive():
+    with pytest.raises(ValueError, match="mutually exclusive"):
+        argv(mem_mb=8000, mem_gb=8.0)
+
+
+@pytest.mark.parametrize(
+    "image",
+    [
+        "nipreps/fmriprep",
+        "nipreps/fmriprep:24.1.0",
+        "ghcr.io/me/fmriprep:24.0.0",
+        "myreg:5000/fmriprep",
+    ],
+)
+def test_docker_image_is_passed_through(image):
+    assert argv(docker_image=image)[-2:] == ["--image", image]
+
+
+def test_docker_version_selects_upstream_tag():
+    assert argv(docker_version="23.2.1")[-2:] == ["--image", "nipreps/fmriprep:23.2.1"]
+
+
+def test_default_docker_version_emits_no_image():
+    assert "--image" not in argv(docker_version="latest")
+
+
+def test_docker_image_and_version_are_exclusive():
+    with pytest.raises(ValueError, match="mutually exclusive"):
+        argv(docker_image="me/fmriprep", docker_version="23.2.1")
+
+
+def test_interface_formats_command_from_inputs(tmp_path):
+    interface = FMRIPrepInterface()
+    interface.inputs.bids_dir = str(tmp_path)
+    interface.inputs.output_dir = "/out"
+    interface.inputs.participant_label = ["001"]
+    interface.inputs.n_cpus = 4
+    assert interface._format_command() == [
+        "fmriprep-docker",
+        str(tmp_path),
+        "/out",
+        "participant",
+        "--participant-label",
+        "001",
+        "--n_cpus",
+        "4",
+        "--omp-nthreads",
+        "2",
+    ]
@@ -0,0 +1,52 @@
+"""Tests for `yyprep.dicom2bids.intended_for`."""
+
+import json
+
+import pytest
+
+from yyprep.dicom2bids import intended_for
+from yyprep.dicom2bids.intended_for import _rewrite_one
+
+NEW_FUNC = "bids::sub-01/ses-01/func/sub-01_ses-01_task-rest_bold.nii.gz"
+OLD_FUNC = "ses-01/func/sub-01_ses-01_task-old_bold.nii.gz"
+
+
+@pytest.fixture
+def fmap_json(tmp_path):
+    """Return a helper writing a fmap sidecar with the given contents."""
+
+    def _write(data):
+        path = tmp_path / "sub-01_ses-01_dir-AP_epi.json"
+        path.write_text(json.dumps(data))
+        return path
+
+    return _write
+
+
+@pytest.mark.parametrize(
+    ("existing", "expected"),
+    [
+        ({}, [NEW_FUNC]),
+        ({"IntendedFor": OLD_FUNC}, sorted([OLD_FUNC, NEW_FUNC])),
+        ({"IntendedFor": [OLD_FUNC]}, sorted([OLD_FUNC, NEW_FUNC])),
+    ],
+    ids=["missing", "string", "list"],
+)
+def test_rewrite_one_merges_intended_for(fmap_json, existing, expected):
+    path = fmap_json({"PhaseEncodingDirection": "j-", **existing})
+    assert _rewrite_one(path, frozenset([NEW_FUNC])) is True
+    data = json.loads(path.read_text())
+    assert data["IntendedFor"] == expected
+    assert data["PhaseEncodingDirection"] == "j-"
+
+
+@pytest.mark.parametrize(
+    "existing", [[OLD_FUNC, NEW_FUNC], NEW_FUNC], ids=["list", "string"]
+)
+def test_rewrite_one_skips_complete_sidecar(fmap_json, monkeypatch, existing):
+    path = fmap_json({"IntendedFor": existing})
+    writes = []
+    monkeypatch.setattr(intended_for, "_write_json", lambda *args: writes.append(args))
+    assert _rewrite_one(path, frozenset([NEW_FUNC])) is False
+    assert writes == []
+    assert json.loads(path.read_text()) == {"IntendedFor": existing}